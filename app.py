@@ -1,16 +1,18 @@
 import os
-import shutil
+import re
+import math
+import sqlite3
 import logging
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Dict, Any
+from operator import itemgetter, mul
+from typing import Dict, Any, Iterable, Tuple
 
 import pandas as pd
 import streamlit as st
 from html import escape
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float
+from sqlalchemy import create_engine, event, func, select, Column, Integer, String, DateTime, Float
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # ══════════════════ CONFIGURACIÓN ══════════════════
@@ -21,15 +23,30 @@ logging.basicConfig(filename="app.log", level=logging.INFO,
 DB_FILE = "optica.db"
 BACKUP_DIR = "backups"
 DATABASE_URL = f"sqlite:///{DB_FILE}"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
+SQLITE_PRAGMAS = ("journal_mode=WAL", "synchronous=NORMAL", "temp_store=MEMORY",
+                  "mmap_size=268435456", "cache_size=-65536")
+PACIENTES_POR_PAGINA = 20
+TIPOS_LENTE = ("Monofocal", "Bifocal", "Progresivo")
+FORMAS_PAGO = ("Efectivo", "T. Crédito", "T. Débito")
+COLUMNAS_CATEGORICAS = ("Tipo_Lente", "Forma_Pago")
+COLUMNAS_TEXTO = ("Nombre", "RUT", "Teléfono")  # strings Arrow: groupby/igualdad en C, menos RAM
+_VENTAS_DTYPES = {"Valor": "float64", "Edad": "Int16", **{c: "category" for c in COLUMNAS_CATEGORICAS},
+                  **{c: "string[pyarrow]" for c in COLUMNAS_TEXTO}}
+COLUMNAS_ULTIMAS_VENTAS = ["Fecha_venta","Nombre","RUT","Tipo_Lente","Valor","Forma_Pago"]
+COLUMNAS_HISTORIAL = ["Fecha_venta","Tipo_Lente","Valor","Forma_Pago","Armazon","Cristales"]
+COLUMNAS_RECETA = ["OD_SPH","OI_SPH"]  # con alguna esfera cargada la venta tiene receta
+_RUT_CLEAN = str.maketrans("", "", ".-")
+_RUT_RE = re.compile(r"[0-9]{7,8}[0-9K]")
+_RUT_PESOS = (2, 3, 4, 5, 6, 7, 2, 3)  # pesos del cuerpo leído de derecha a izquierda
+_DV_MAP = ("0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "K")  # índice: (-suma) % 11
+SessionLocal = sessionmaker()
 Base = declarative_base()
 
 # ══════════════════ MODELO ORM ══════════════════
 class Venta(Base):
     __tablename__ = "ventas"
     id = Column(Integer, primary_key=True, index=True)
-    RUT = Column(String)
+    RUT = Column(String, index=True)
     Nombre = Column(String)
     Edad = Column(Integer)
     Teléfono = Column(String)
@@ -38,7 +55,7 @@ class Venta(Base):
     Cristales = Column(String)
     Valor = Column(Float)
     Forma_Pago = Column(String)
-    Fecha_venta = Column(DateTime)
+    Fecha_venta = Column(DateTime, index=True)
     OD_SPH = Column(String)
     OD_CYL = Column(String)
     OD_EJE = Column(String)
@@ -49,91 +66,239 @@ class Venta(Base):
     DP_CERCA = Column(String)
     ADD = Column(String)
 
-# Crear DB si no existe
-Base.metadata.create_all(bind=engine)
+def _sqlite_pragmas(dbapi_conn, _):
+    # WAL: lecturas y escrituras no se bloquean; NORMAL evita un fsync extra por commit
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(f"PRAGMA {pragma}")
+    cur.close()
+
+@st.cache_resource
+def get_engine():
+    """Engine único por proceso; la DB se crea/prepara solo la primera vez, no en cada rerun."""
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _sqlite_pragmas)
+    # Crear DB si no existe
+    Base.metadata.create_all(bind=engine)
+    # create_all no agrega índices a una tabla ya existente
+    for idx in Venta.__table__.indexes:
+        idx.create(bind=engine, checkfirst=True)
+    return engine
 
 # ══════════════════ UTILIDADES ══════════════════
 def backup_db():
-    os.makedirs(BACKUP_DIR, exist_ok=True)
-    ts = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = os.path.join(BACKUP_DIR, f"optica_{ts}.db")
+    # Corre en el executor y nadie lee su Future: todo fallo debe quedar en app.log
     try:
-        shutil.copy(DB_FILE, backup_path)
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        ts = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_path = os.path.join(BACKUP_DIR, f"optica_{ts}.db")
+        # API de respaldo en línea de SQLite: copia consistente aunque haya escrituras en curso
+        src = sqlite3.connect(DB_FILE)
+        try:
+            dst = sqlite3.connect(backup_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
     except Exception as e:
         logging.warning(f"Backup falló: {e}")
 
+@st.cache_resource
+def _executor_respaldos() -> ThreadPoolExecutor:
+    # Un solo hilo por proceso: los respaldos no bloquean el envío del formulario
+    return ThreadPoolExecutor(max_workers=1)
+
+def _hoy() -> dt.date:
+    # Una sola lectura del reloj por ejecución del script; MAIN la reinicia en cada rerun.
+    # Los reruns de un st.fragment no pasan por MAIN: ahí se usa dt.date.today() directo.
+    if "_hoy" not in st.session_state:
+        st.session_state["_hoy"] = dt.date.today()
+    return st.session_state["_hoy"]
+
 def validar_rut(r: str) -> bool:
-    import re
-    s = r.upper().replace(".", "").replace("-", "")
-    if not re.fullmatch(r"[0-9]{7,8}[0-9K]", s):
+    s = r.upper().translate(_RUT_CLEAN)
+    if not _RUT_RE.fullmatch(s):
         return False
     cuerpo, dv = s[:-1], s[-1]
-    suma, factor = 0, 2
-    for c in reversed(cuerpo):
-        suma += int(c) * factor
-        factor = 2 if factor == 7 else factor + 1
-    dv_calc = 11 - (suma % 11)
-    dv_calc = {10: "K", 11: "0"}.get(dv_calc, str(dv_calc))
-    return dv == dv_calc
+    suma = sum(map(mul, map(int, reversed(cuerpo)), _RUT_PESOS))
+    return dv == _DV_MAP[(-suma) % 11]
 
 def formatear_rut(r: str) -> str:
-    s = r.replace(".", "").replace("-", "").upper()
-    cuerpo, dv = s[:-1], s[-1]
-    cuerpo = f"{int(cuerpo):,}".replace(",", ".")
-    return f"{cuerpo}-{dv}"
+    s = r.translate(_RUT_CLEAN).upper()
+    cuerpo, dv = s[:-1].lstrip("0") or "0", s[-1]
+    grupos = [cuerpo[max(i - 3, 0):i] for i in range(len(cuerpo), 0, -3)]
+    return f"{'.'.join(reversed(grupos))}-{dv}"
 
-def generar_pdf_receta(p: Dict[str, Any]) -> BytesIO:
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=letter)
-    c.setTitle(f"Receta {p['Nombre']}")
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(72, 750, "BMA Ópticas – Receta Óptica")
-    c.setFont("Helvetica", 12)
-    c.drawString(72, 730, f"Paciente: {escape(p['Nombre'])}")
-    c.drawString(72, 712, f"RUT: {p['RUT']}")
-    c.drawString(400, 712, dt.datetime.now().strftime("%d/%m/%Y"))
-    y = 680
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(72, y, "OD / OI   ESF   CIL   EJE")
-    y -= 20
-    c.setFont("Helvetica", 12)
-    c.drawString(72, y, f"OD: {p['OD_SPH']}  {p['OD_CYL']}  {p['OD_EJE']}")
-    y -= 20
-    c.drawString(72, y, f"OI: {p['OI_SPH']}  {p['OI_CYL']}  {p['OI_EJE']}")
-    y -= 30
-    for label in ["DP_Lejos","DP_CERCA","ADD"]:
-        if p[label]:
-            c.drawString(72, y, f"{label.replace('_',' ')}: {p[label]}")
-            y -= 18
+_FUENTE_TITULO = ("Helvetica-Bold", 16)
+_FUENTE_NEGRITA = ("Helvetica-Bold", 12)
+_FUENTE_NORMAL = ("Helvetica", 12)
+_TITULO_RECETA = "BMA Ópticas – Receta Óptica"
+_CABECERA_RECETA = "OD / OI   ESF   CIL   EJE"
+# Filas OD/OI: etiqueta, columnas ESF/CIL/EJE e interlineado hasta la línea siguiente
+_OJOS_RECETA = (("OD", itemgetter("OD_SPH", "OD_CYL", "OD_EJE"), 20),
+                ("OI", itemgetter("OI_SPH", "OI_CYL", "OI_EJE"), 30))
+_EXTRAS_RECETA = (("DP_Lejos", "DP Lejos"), ("DP_CERCA", "DP CERCA"), ("ADD", "ADD"))
+_CAMPOS_RECETA = ("Nombre", "RUT", "OD_SPH", "OD_CYL", "OD_EJE", "OI_SPH", "OI_CYL", "OI_EJE",
+                  "DP_Lejos", "DP_CERCA", "ADD")
+
+def _draw_static(c):
+    """Partes fijas de la receta (título, cabecera OD/OI y firma), iguales para todo paciente."""
+    c.setFont(*_FUENTE_TITULO)
+    c.drawString(72, 750, _TITULO_RECETA)
+    c.setFont(*_FUENTE_NEGRITA)
+    c.drawString(72, 680, _CABECERA_RECETA)
+    c.setFont(*_FUENTE_NORMAL)
     c.line(400, 100, 520, 100)
     c.drawString(430, 85, "Firma Óptico")
+
+def _draw_receta(c, p: Dict[str, Any], fecha: str):
+    _draw_static(c)
+    c.drawString(72, 730, f"Paciente: {escape(p['Nombre'])}")
+    c.drawString(72, 712, f"RUT: {p['RUT']}")
+    c.drawString(400, 712, fecha)
+    # Graduación y extras en un solo objeto de texto; el interlineado replica el layout
+    t = c.beginText(72, 660)
+    t.setFont(*_FUENTE_NORMAL)
+    for ojo, valores, interlineado in _OJOS_RECETA:
+        t.setLeading(interlineado)
+        t.textLine(f"{ojo}: {'  '.join(map(str, valores(p)))}")
+    t.setLeading(18)
+    t.textLines([f"{label}: {p[col]}" for col, label in _EXTRAS_RECETA if p[col]])
+    c.drawText(t)
+
+@st.cache_data(max_entries=128)
+def _pdf_receta_bytes(campos: Tuple[Any, ...], fecha: str) -> bytes:
+    # ReportLab solo se importa al generar una receta (arranque más rápido)
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    p = dict(zip(_CAMPOS_RECETA, campos))
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter, pageCompression=1)
+    c.setTitle(f"Receta {p['Nombre']}")
+    _draw_receta(c, p, fecha)
+    c.save()
+    return buf.getvalue()
+
+def generar_pdf_receta(p: Dict[str, Any]) -> BytesIO:
+    # Misma receta el mismo día -> mismos bytes; se sirven desde la caché.
+    # Fecha leída aquí y no con _hoy(): se llama desde el fragmento _tarjeta_paciente.
+    campos = tuple(p[k] for k in _CAMPOS_RECETA)
+    return BytesIO(_pdf_receta_bytes(campos, dt.date.today().strftime("%d/%m/%Y")))
+
+def pdf_recetas_bulk(ps: Iterable[Dict[str, Any]]) -> BytesIO:
+    """Todas las recetas en un solo PDF: un Canvas, una página por paciente."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter, pageCompression=1)
+    c.setTitle("Recetas BMA Ópticas")
+    fecha = _hoy().strftime("%d/%m/%Y")
+    for p in ps:
+        _draw_receta(c, p, fecha)
+        c.showPage()
     c.save()
     buf.seek(0)
     return buf
 
 # ══════════════════ FUNCIONES DB ══════════════════
 def insertar_venta(data: Dict[str, Any]):
-    session = SessionLocal()
+    session = SessionLocal(bind=get_engine())
     try:
         venta = Venta(**data)
         session.add(venta)
         session.commit()
+        for cached in (_leer_ventas_cached, _index_by_rut, _rango_fechas, _resumen_ventas, _resumen_rango):
+            cached.clear()
     except Exception as e:
         st.error(f"❌ Error insertando venta: {e}")
         session.rollback()
     finally:
         session.close()
 
+def _consultar_ventas(query) -> pd.DataFrame:
+    # Filas directo del cursor al DataFrame, sin instanciar objetos ORM
+    return pd.read_sql_query(query, get_engine(), parse_dates=["Fecha_venta"], dtype=_VENTAS_DTYPES)
+
+def _db_huella() -> Tuple[int, ...]:
+    get_engine()  # la primera vez crea optica.db
+    # Con WAL los commits caen primero en optica.db-wal, así que se consideran ambos.
+    # El tamaño cubre commits dentro de la resolución del mtime del sistema de archivos.
+    huella = ()
+    for ruta in (DB_FILE, f"{DB_FILE}-wal"):
+        if os.path.exists(ruta):
+            info = os.stat(ruta)
+            huella += (info.st_mtime_ns, info.st_size)
+    return huella
+
+# cache_resource: el DataFrame se comparte sin copiarlo/deserializarlo en cada rerun.
+# Es de solo lectura: las pantallas derivan frames nuevos y nunca lo modifican in situ.
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _leer_ventas_cached(huella: Tuple[int, ...]) -> pd.DataFrame:
+    return _consultar_ventas(select(Venta.__table__))
+
 def leer_ventas() -> pd.DataFrame:
-    session = SessionLocal()
-    try:
-        ventas = session.query(Venta).all()
-        df = pd.DataFrame([v.__dict__ for v in ventas])
-        if not df.empty:
-            df = df.drop("_sa_instance_state", axis=1)
-        return df
-    finally:
-        session.close()
+    # La clave es mtime+tamaño de la DB: solo se vuelve a consultar si cambió el archivo
+    return _leer_ventas_cached(_db_huella())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _rango_fechas(huella: Tuple[int, ...]) -> Tuple[Any, Any]:
+    with get_engine().connect() as conn:
+        return tuple(conn.execute(select(func.min(Venta.Fecha_venta), func.max(Venta.Fecha_venta))).one())
+
+def _ventas_en_rango(desde: dt.date, hasta: dt.date, huella: Tuple[int, ...]) -> pd.DataFrame:
+    """Solo las ventas del rango; el filtro corre en SQLite sobre el índice de Fecha_venta.
+
+    Sin caché propia: su único uso es _resumen_rango, que ya cachea con la misma clave.
+    """
+    inicio = dt.datetime.combine(desde, dt.time.min)
+    fin = dt.datetime.combine(hasta + dt.timedelta(days=1), dt.time.min)
+    return _consultar_ventas(select(Venta.__table__)
+                             .where(Venta.Fecha_venta >= inicio, Venta.Fecha_venta < fin))
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _index_by_rut(huella: Tuple[int, ...]) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Any]]:
+    """Ventas ordenadas por RUT, última venta por RUT y posiciones de cada historial.
+
+    Todo vectorizado y compartido sin copias; la pantalla arma Series/tablas solo para su página.
+    """
+    # Un solo sort (RUT, fecha desc.): la primera fila de cada grupo es la última venta
+    ordenado = _leer_ventas_cached(huella).sort_values(
+        ["RUT", "Fecha_venta", "id"], ascending=[True, False, False], kind="mergesort")
+    # Máscara de receta vectorizada una vez, en vez de revisar cada paciente en cada rerun
+    ordenado["_tiene_receta"] = ordenado[COLUMNAS_RECETA].fillna("").ne("").any(axis=1)
+    grupos = ordenado.groupby("RUT", sort=False)
+    return ordenado, grupos.head(1), grupos.indices
+
+def _calcular_resumen(df: pd.DataFrame) -> Dict[str, Any]:
+    """Métricas y agregados de las pantallas."""
+    por_mes = df.groupby(df["Fecha_venta"].dt.to_period("M"))["Valor"].sum()
+    por_mes.index = por_mes.index.astype(str).rename("Mes")
+    # El ticket medio reutiliza la suma en vez de recorrer Valor otra vez con .mean()
+    valor = df["Valor"].dropna().to_numpy()
+    total = valor.sum()
+    return {
+        "total": total,
+        "medio": total / valor.size if valor.size else float("nan"),
+        "max": valor.max() if valor.size else float("nan"),
+        "min": valor.min() if valor.size else float("nan"),
+        "pacientes": df["RUT"].nunique(),
+        "por_tipo": df.groupby("Tipo_Lente", observed=True)["Valor"].sum(),
+        "por_mes": por_mes,
+    }
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _resumen_ventas(huella: Tuple[int, ...]) -> Dict[str, Any]:
+    """Resumen de todas las ventas; se recalcula solo cuando cambia la DB."""
+    return _calcular_resumen(_leer_ventas_cached(huella))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _resumen_rango(desde: dt.date, hasta: dt.date, huella: Tuple[int, ...]) -> Dict[str, Any]:
+    """Resumen de un rango de fechas; las ventas del rango se consultan solo al fallar la caché."""
+    return _calcular_resumen(_ventas_en_rango(desde, hasta, huella))
 
 # ══════════════════ UI ══════════════════
 def header():
@@ -152,12 +317,12 @@ def registrar_venta():
             edad = st.number_input("Edad*", min_value=0, max_value=120, value=0)
             telefono = st.text_input("Teléfono")
         with c2:
-            tipo_lente = st.selectbox("Tipo de lente", ["Monofocal","Bifocal","Progresivo"])
+            tipo_lente = st.selectbox("Tipo de lente", TIPOS_LENTE)
             armazon = st.text_input("Armazón")
             cristales = st.text_input("Cristales")
             valor = st.number_input("Valor venta*", min_value=0, step=1000)
-            forma = st.selectbox("Forma de pago", ["Efectivo","T. Crédito","T. Débito"])
-        fecha = st.date_input("Fecha de venta", dt.date.today())
+            forma = st.selectbox("Forma de pago", FORMAS_PAGO)
+        fecha = st.date_input("Fecha de venta", _hoy())
         st.markdown("**Datos ópticos (opcional)**")
         od_sph = st.text_input("OD ESF"); od_cyl = st.text_input("OD CIL"); od_eje = st.text_input("OD EJE")
         oi_sph = st.text_input("OI ESF"); oi_cyl = st.text_input("OI CIL"); oi_eje = st.text_input("OI EJE")
@@ -167,7 +332,7 @@ def registrar_venta():
     if not enviar:
         return
 
-    raw = rut_in.replace(".", "").replace("-", "").upper()
+    raw = rut_in.translate(_RUT_CLEAN).upper()
     if not validar_rut(raw):
         st.error("❌ RUT inválido")
         return
@@ -194,77 +359,80 @@ def registrar_venta():
     }
 
     insertar_venta(data)
-    backup_db()
+    _executor_respaldos().submit(backup_db)
     st.success("✅ Venta registrada")
 
+@st.fragment
+def _tarjeta_paciente(rut: str, pac: pd.Series, tabla: pd.DataFrame):
+    # Fragmento: el botón de receta solo re-ejecuta esta tarjeta, no toda la app
+    with st.expander(f"{pac['Nombre']} – {rut} ({len(tabla)} ventas)"):
+        st.dataframe(tabla, use_container_width=True, hide_index=True)
+        if pac["_tiene_receta"]:
+            if st.button("📄 Descargar Receta", key=f"pdf_{rut}"):
+                pdf = generar_pdf_receta(pac.to_dict())
+                st.download_button("⬇️ Descargar", pdf,
+                    file_name=f"Receta_{pac['Nombre'].replace(' ','_')}.pdf",
+                    mime="application/pdf", key=f"dl_{rut}")
+
 def pantalla_pacientes():
     st.subheader("👁️ Pacientes / Historial")
-    df = leer_ventas()
-    if df.empty:
+    ordenado, ultimas, posiciones = _index_by_rut(_db_huella())
+    if ultimas.empty:
         st.info("No hay registros aún")
         return
-    for rut, grp in df.groupby("RUT"):
-        pac = grp.iloc[-1]
-        with st.expander(f"{pac['Nombre']} – {rut} ({len(grp)} ventas)"):
-            tabla = grp[["Fecha_venta","Tipo_Lente","Valor","Forma_Pago","Armazon","Cristales"]]
-            tabla = tabla.sort_values("Fecha_venta", ascending=False).rename(columns={"Fecha_venta":"Fecha"})
-            st.dataframe(tabla, use_container_width=True)
-            if any([pac[col] for col in ("OD_SPH","OI_SPH")]):
-                if st.button("📄 Descargar Receta", key=f"pdf_{rut}"):
-                    pdf = generar_pdf_receta(pac.to_dict())
-                    st.download_button("⬇️ Descargar", pdf,
-                        file_name=f"Receta_{pac['Nombre'].replace(' ','_')}.pdf",
-                        mime="application/pdf", key=f"dl_{rut}")
+    con_receta = ultimas[ultimas["_tiene_receta"]]
+    if not con_receta.empty and st.button("📄 Exportar todas las recetas"):
+        st.download_button("⬇️ Descargar recetas", pdf_recetas_bulk(con_receta.to_dict("records")),
+            file_name=f"Recetas_{_hoy():%Y%m%d}.pdf", mime="application/pdf")
+    paginas = max(1, math.ceil(len(ultimas) / PACIENTES_POR_PAGINA))
+    pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1) if paginas > 1 else 1
+    inicio = (pagina - 1) * PACIENTES_POR_PAGINA
+    # Series e historial solo para los pacientes de esta página
+    for _, pac in ultimas.iloc[inicio:inicio + PACIENTES_POR_PAGINA].iterrows():
+        tabla = ordenado.iloc[posiciones[pac["RUT"]]][COLUMNAS_HISTORIAL].rename(columns={"Fecha_venta": "Fecha"})
+        _tarjeta_paciente(pac["RUT"], pac, tabla)
 
 def pantalla_reportes():
     st.subheader("📊 Reportes")
-    df = leer_ventas()
-    if df.empty:
+    huella = _db_huella()
+    min_f, max_f = _rango_fechas(huella)
+    if min_f is None:
         st.info("No hay datos para reportar")
         return
-    min_d = df["Fecha_venta"].min().date()
-    max_d = df["Fecha_venta"].max().date()
+    min_d, max_d = min_f.date(), max_f.date()
     desde, hasta = st.date_input("Rango de fechas", [min_d, max_d], min_value=min_d, max_value=max_d)
-    mask = (df["Fecha_venta"].dt.date >= desde) & (df["Fecha_venta"].dt.date <= hasta)
-    data = df[mask]
 
     st.markdown("### 🔑 Estadísticas clave")
+    r = _resumen_rango(desde, hasta, huella)
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Total ventas", f"${data['Valor'].sum():,.0f}")
-    c2.metric("Ticket medio", f"${data['Valor'].mean():,.0f}")
-    c3.metric("Venta máx.", f"${data['Valor'].max():,.0f}")
-    c4.metric("Venta mín.", f"${data['Valor'].min():,.0f}")
+    c1.metric("Total ventas", f"${r['total']:,.0f}")
+    c2.metric("Ticket medio", f"${r['medio']:,.0f}")
+    c3.metric("Venta máx.", f"${r['max']:,.0f}")
+    c4.metric("Venta mín.", f"${r['min']:,.0f}")
 
     st.markdown("### 📈 Ventas por mes")
-    vm = (data.assign(Mes=data["Fecha_venta"].dt.to_period("M"))
-             .groupby("Mes")["Valor"].sum()
-             .reset_index())
-    vm["Mes"] = vm["Mes"].astype(str)
-    st.line_chart(vm.set_index("Mes")["Valor"])
+    st.line_chart(r["por_mes"])
 
     st.markdown("### 💳 Ventas por tipo de lente")
-    vt = data.groupby("Tipo_Lente")["Valor"].sum()
-    st.bar_chart(vt)
+    st.bar_chart(r["por_tipo"])
 
 def pantalla_inicio():
     st.subheader("🏠 Inicio")
-    df = leer_ventas()
+    # Una sola huella para el frame y su resumen: ambos corresponden al mismo estado de la DB
+    huella = _db_huella()
+    df = _leer_ventas_cached(huella)
     if df.empty:
         st.info("Aún no hay ventas")
         return
-    u = df["RUT"].nunique()
-    t = df["Valor"].sum()
-    m = df["Valor"].mean()
+    r = _resumen_ventas(huella)
     c1, c2, c3 = st.columns(3)
-    c1.metric("Pacientes únicos", u)
-    c2.metric("Total ventas", f"${t:,.0f}")
-    c3.metric("Ticket medio", f"${m:,.0f}")
-    st.write(df.tail(5))
+    c1.metric("Pacientes únicos", r["pacientes"])
+    c2.metric("Total ventas", f"${r['total']:,.0f}")
+    c3.metric("Ticket medio", f"${r['medio']:,.0f}")
+    st.dataframe(df[COLUMNAS_ULTIMAS_VENTAS].tail(5), use_container_width=True, hide_index=True)
 
 # ══════════════════ MAIN ══════════════════
-# Siempre tener un DataFrame disponible para cálculos globales
-df = leer_ventas()
-
+st.session_state.pop("_hoy", None)
 header()
 menu = st.sidebar.radio("Menú", ["🏠 Inicio", "💰 Registrar venta", "👁️ Pacientes", "📊 Reportes"])
 